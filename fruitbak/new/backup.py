@@ -1,6 +1,6 @@
 from collections.abc import Mapping
 from fcntl import LOCK_EX, LOCK_NB, flock
-from json import dump as dump_json
+from json import dumps as dumps_json
 from os import fwalk, rename, rmdir, unlink
 from pathlib import Path
 
@@ -320,7 +320,7 @@ class NewBackup(Initializer):
                 self.post_command(fruitbak=self.fruitbak, host=self.host, backup=self)
 
             with open('info.json', 'w', opener=backupdir_fd.opener) as fp:
-                dump_json(info, fp)
+                fp.write(dumps_json(info))
 
             hostdir_fd = self.host.hostdir_fd
 
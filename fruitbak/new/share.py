@@ -1,6 +1,6 @@
 """Represent a share to back up and the machinery to do so."""
 
-from json import dump as dump_json
+from json import dumps as dumps_json
 
 from hardhat import HardhatMaker
 from hashset import Hashset
@@ -274,6 +274,19 @@ class NewShare(Initializer):
 
         return self.newbackup.hashes_fp
 
+    @initializer
+    def hashes_buf(self):
+        """Hashes of files in this share that have not yet been written to
+        `hashes_fp`. Collected here so that they can be written out in large
+        blocks instead of one `write` call per file.
+
+        :type: bytearray"""
+
+        return bytearray()
+
+    # Flush hashes_buf to hashes_fp when it grows beyond this size
+    hashes_buf_size = 1 << 20
+
     @initializer
     def hash_func(self):
         """The globally configured hash function.
@@ -304,7 +317,7 @@ class NewShare(Initializer):
         if hash is None:
             hash = self.hash_func(value)
 
-        if hash in self.missing_hashes or hash not in self.predecessor_hashes:
+        if hash not in self.predecessor_hashes or hash in self.missing_hashes:
             self.agent.put_chunk(hash, value, wait=False)
 
         return hash
@@ -315,9 +328,20 @@ class NewShare(Initializer):
         :param fruitbak.dentry.Dentry value: The metadata to add."""
 
         if dentry.is_file and not dentry.is_hardlink:
-            self.hashes_fp.write(dentry.extra)
+            hashes_buf = self.hashes_buf
+            hashes_buf += dentry.extra
+            if len(hashes_buf) >= self.hashes_buf_size:
+                self.flush_hashes()
         self.hardhat_maker.add(dentry.name, bytes(dentry))
 
+    def flush_hashes(self):
+        """Write any hashes collected in `hashes_buf` to `hashes_fp`."""
+
+        hashes_buf = self.hashes_buf
+        if hashes_buf:
+            self.hashes_fp.write(hashes_buf)
+            hashes_buf.clear()
+
     def backup(self, full=False):
         """Backup this share.
 
@@ -325,7 +349,6 @@ class NewShare(Initializer):
         :return: Basic information and statistics.
         :rtype: dict"""
 
-        transfer = self.transfer(newshare=self)
         # print(repr(self.newbackup.predecessor))
         # print(repr(self.reference))
         hostconfig = self.host.config
@@ -345,11 +368,17 @@ class NewShare(Initializer):
                 share=self,
             )
 
+            # Only set up the transfer and the metadata directory (through
+            # hardhat_maker) once pre_command has succeeded.
+            transfer = self.transfer(newshare=self)
+
             info['startTime'] = time_ns()
 
             with self.hardhat_maker:
                 transfer.transfer()
 
+            self.flush_hashes()
+
             info['endTime'] = time_ns()
 
             self.post_command(
@@ -360,6 +389,6 @@ class NewShare(Initializer):
             )
 
         with open('info.json', 'w', opener=self.sharedir_fd.opener) as fp:
-            dump_json(info, fp)
+            fp.write(dumps_json(info))
 
         return info
@@ -20,8 +20,6 @@ Unless you are implementing a storage method or filter you should never
 need anything from this module except the `Pool.agent()` method (which
 creates a new agent)."""
 
-from weakref import WeakValueDictionary
-
 from fruitbak.config import configurable, configurable_function
 from fruitbak.pool.agent import PoolAgent
 from fruitbak.pool.storage import Filesystem
@@ -29,12 +27,37 @@ from fruitbak.util import (
     Initializer,
     MinWeakHeapMap,
     NLock,
+    WeakValueCache,
     initializer,
     locked,
     weakproperty,
 )
 
 
+class _Completion:
+    """Wrapper for the callback of a submitted I/O request that updates the
+    queue depth of the pool once the request has completed. For internal use
+    only.
+
+    :param Pool pool: The pool the request was submitted to.
+    :param function callback: The callback to invoke."""
+
+    __slots__ = 'pool', 'callback'
+
+    def __init__(self, pool, callback):
+        self.pool = pool
+        self.callback = callback
+
+    def __call__(self, *args, **kwargs):
+        try:
+            self.callback(*args, **kwargs)
+        finally:
+            pool = self.pool
+            with pool.lock:
+                pool.queue_depth -= 1
+                pool.replenish_queue()
+
+
 class Pool(Initializer):
     """Represents the pool subsystem and maintains the tree of storage
     implementation(s) and filters.
@@ -52,6 +75,9 @@ class Pool(Initializer):
 
     queue_depth = 0
 
+    # Whether replenish_queue() is currently running
+    replenishing = False
+
     @initializer
     def config(self):
         """The global Fruitbak configuration object.
@@ -75,6 +101,22 @@ class Pool(Initializer):
 
         return 32
 
+    @configurable('pool_chunk_cache_size')
+    def chunk_cache_size(self):
+        """The number of recently fetched chunks that are kept in memory even if
+        no agent holds a reference to them anymore, so that they can be handed
+        out again without another round trip to storage. Chunks that are still
+        in use are always shared, regardless of this setting.
+
+        Defaults to `max_queue_depth`.
+
+        This property is user-configurable under the name
+        `pool_chunk_cache_size`.
+
+        :type: int"""
+
+        return self.max_queue_depth
+
     @weakproperty
     def fruitbak(self):
         """A weak reference to the `Fruitbak` object that created us. For internal
@@ -165,14 +207,29 @@ class Pool(Initializer):
     @initializer
     def chunk_registry(self):
         """A weak dictionary of known chunks, to ensure that chunks are kept in
-        memory only once. Only used by `exchange_chunk()`.
+        memory only once. The `chunk_cache_size` most recently used chunks are
+        kept alive even when nothing else refers to them. Only used by
+        `exchange_chunk()`.
 
         The pool lock must be held while accessing this attribute.
 
-        :type: weakref.WeakValueDictionary"""
+        :type: fruitbak.util.WeakValueCache"""
 
         assert self.lock
-        return WeakValueDictionary()
+        return WeakValueCache(self.chunk_cache_size)
+
+    @initializer
+    def inflight_reads(self):
+        """Callbacks for chunks that are currently being fetched from storage,
+        keyed by hash. Used by `get_chunk()` to make sure that concurrent
+        requests for the same chunk result in only one fetch.
+
+        The pool lock must be held while accessing this attribute.
+
+        :type: dict(bytes, list(function))"""
+
+        assert self.lock
+        return {}
 
     def exchange_chunk(self, hash, chunk=None):
         """Exchange the given chunk for an already existing copy, if such a copy
@@ -181,27 +238,27 @@ class Pool(Initializer):
 
         The pool lock must be held while calling this method.
 
+        Because `bytes` objects can not be weakly referenced, they are wrapped
+        in a `memoryview` before they are stored.
+
         :param bytes hash: The hash of the requested chunk.
         :param chunk: A chunk that has the given hash.
         :type chunk: bytes or None
         :return: The already existing chunk if it exists, or `chunk` if not.
-        :rtype: bytes or None"""
+        :rtype: memoryview or None"""
 
         assert self.lock
         # can't use setdefault(), it has weird corner cases
         # involving None
         chunk_registry = self.chunk_registry
-        try:
-            return chunk_registry[hash]
-        except KeyError:
-            pass
+        existing = chunk_registry.get(hash)
+        if existing is not None:
+            return existing
         if chunk is not None:
-            try:
-                chunk_registry[hash] = chunk
-            except TypeError:
+            if isinstance(chunk, (bytes, bytearray)):
                 # bytes objects can't be weakref'd
                 chunk = memoryview(chunk)
-                chunk_registry[hash] = chunk
+            chunk_registry[hash] = chunk
         return chunk
 
     def agent(self, *args, **kwargs):
@@ -229,14 +286,8 @@ class Pool(Initializer):
         assert self.lock
         new = agent.avarice
         agents = self.agents
-        try:
-            old = agents[agent]
-        except KeyError:
-            pass
-        else:
-            if old == new:
-                return
-        self.agents[agent] = new
+        if agents.get(agent) != new:
+            agents[agent] = new
 
     def unregister_agent(self, agent):
         """Unregister an agent from this pool. Intended for agents
@@ -257,15 +308,27 @@ class Pool(Initializer):
         as it takes to either fill up the queue to `max_queue_depth`
         or until no agents have pending I/O.
 
+        Agents typically update their registration from within `dequeue()`,
+        which calls this method again. Such nested calls return immediately;
+        the outermost call picks up any changes on its next iteration.
+
         The pool lock must be held while calling this method."""
 
         assert self.lock
-        agents = self.agents
-        while agents and self.queue_depth < self.max_queue_depth:
-            agent = agents.peekkey()
-            if agent is None:
-                break
-            agent.dequeue()
+        if self.replenishing:
+            return
+        self.replenishing = True
+        try:
+            agents = self.agents
+            max_queue_depth = self.max_queue_depth
+            while self.queue_depth < max_queue_depth:
+                item = agents.peekitem_or_none()
+                if item is None:
+                    break
+                agent, avarice = item
+                agent.dequeue()
+        finally:
+            self.replenishing = False
 
     def has_chunk(self, callback, hash):
         """Submit a request to check the existence of a chunk in the pool.
@@ -287,15 +350,55 @@ class Pool(Initializer):
 
         The callback is a function that will be called with the result once
         the operation has completed or an exception occurred.
-        It is called with two arguments, the result value (a bytes-like object) and
-        any exception that occurred. Exactly one of these is always `None`.
+        It is called with two arguments, the result value (a bytes-like object,
+        usually a `memoryview`) and any exception that occurred. Exactly one of
+        these is always `None`.
+
+        Fetched chunks are registered using `exchange_chunk()`; callers that
+        want to avoid I/O for chunks that are still in memory should look them
+        up in `chunk_registry` first.
+
+        If the same chunk is already being fetched, no new request is submitted;
+        the callback will be called with the result of the pending request
+        instead.
 
         The pool lock must be held while calling this method.
 
         :param function callback: Called when the I/O completed (or failed).
         :param bytes hash: The hash of the chunk to fetch."""
 
-        return self.submit(self.root.get_chunk, callback, hash)
+        assert self.lock
+        inflight_reads = self.inflight_reads
+        callbacks = inflight_reads.get(hash)
+        if callbacks is not None:
+            callbacks.append(callback)
+            return
+
+        callbacks = [callback]
+        inflight_reads[hash] = callbacks
+
+        def when_done(value, exception):
+            with self.lock:
+                del inflight_reads[hash]
+                if value is not None:
+                    value = self.exchange_chunk(hash, value)
+            # Every waiter gets its result, even if an earlier callback
+            # fails; the first failure is passed on to our caller.
+            failure = None
+            for callback in callbacks:
+                try:
+                    callback(value, exception)
+                except BaseException as e:
+                    if failure is None:
+                        failure = e
+            if failure is not None:
+                raise failure
+
+        try:
+            self.submit(self.root.get_chunk, when_done, hash)
+        except BaseException:
+            del inflight_reads[hash]
+            raise
 
     def put_chunk(self, callback, hash, value):
         """Submit a request to store a chunk in the pool.
@@ -341,16 +444,6 @@ class Pool(Initializer):
         :param \\*args: Passed to `func`.
         :param \\*\\*kwargs: Passed to `func`."""
 
-        lock = self.lock
-        assert lock
+        assert self.lock
         self.queue_depth += 1
-
-        def when_done(*args, **kwargs):
-            try:
-                callback(*args, **kwargs)
-            finally:
-                with lock:
-                    self.queue_depth -= 1
-                    self.replenish_queue()
-
-        return func(when_done, *args, **kwargs)
+        return func(_Completion(self, callback), *args, **kwargs)
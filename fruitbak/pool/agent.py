@@ -2,50 +2,135 @@ from collections import OrderedDict, deque
 from threading import Condition
 
 from fruitbak.config import configurable
-from fruitbak.util import Initializer, MinHeapMap, MinWeakHeapMap, NLock, initializer
+from fruitbak.util import Initializer, MinWeakHeapMap, initializer, stub
 
 
 class PoolAction(Initializer):
-    done = False
-    cond = None
-    hash = None
-    value = None
-    exception = None
+    __slots__ = 'agent', 'done', 'hash', 'value', 'exception'
+
+    def __init__(self, **kwargs):
+        self.agent = None
+        self.done = False
+        self.hash = None
+        self.value = None
+        self.exception = None
+        super().__init__(**kwargs)
 
     def sync(self):
-        cond = self.cond
-        with cond:
-            while not self.done:
-                cond.wait()
+        if not self.done:
+            cond = self.agent.cond
+            with cond:
+                while not self.done:
+                    cond.wait()
         exception = self.exception
         if exception:
             raise exception[1]
 
+    @stub
+    def submit(self):
+        """Submit this action to the pool. Called by the agent when it is
+        this action's turn to be scheduled.
+
+        The pool lock must be held while calling this method."""
 
-class PoolGetAction(PoolAction):
-    def sync(self):
-        super().sync()
-        return self.value
 
+class PoolReadAction(PoolAction):
+    __slots__ = ()
 
-class PoolHasAction(PoolAction):
     def sync(self):
         super().sync()
         return self.value
 
+    def submit(self):
+        agent = self.agent
+        agent.pending_reads += 1
+        agent.update_registration()
+
+    def when_done(self, value, exception):
+        agent = self.agent
+        with agent.lock:
+            if exception:
+                self.exception = exception
+                agent.exception = exception
+            else:
+                self.value = value
+            agent.pending_reads -= 1
+            self.done = True
+            agent.cond.notify_all()
+
+
+class PoolGetAction(PoolReadAction):
+    __slots__ = ()
+
+    def submit(self):
+        agent = self.agent
+        pool = agent.pool
+        hash = self.hash
+        value = pool.chunk_registry.get(hash)
+        if value is None:
+            super().submit()
+            pool.get_chunk(self.when_done, hash)
+        else:
+            # The chunk is still in memory, no need to submit any I/O.
+            self.value = value
+            self.done = True
+            agent.cond.notify_all()
+            agent.update_registration()
 
-class PoolPutAction(PoolAction):
-    pass
 
+class PoolHasAction(PoolReadAction):
+    __slots__ = ()
 
-class PoolDelAction(PoolAction):
-    pass
+    def submit(self):
+        super().submit()
+        self.agent.pool.has_chunk(self.when_done, self.hash)
+
+
+class PoolWriteAction(PoolAction):
+    __slots__ = ()
+
+    def submit(self):
+        agent = self.agent
+        serial = agent.next_action_serial
+        agent.next_action_serial = serial + 1
+        agent.pending_writes[self] = serial
+        agent.update_registration()
+
+    def when_done(self, exception):
+        agent = self.agent
+        with agent.lock:
+            del agent.pending_writes[self]
+            agent.update_registration()
+            if exception:
+                self.exception = exception
+                agent.exception = exception
+            self.done = True
+            agent.cond.notify_all()
+
+
+class PoolPutAction(PoolWriteAction):
+    __slots__ = ()
+
+    def submit(self):
+        super().submit()
+        self.agent.pool.put_chunk(self.when_done, self.hash, self.value)
+
+
+class PoolDelAction(PoolWriteAction):
+    __slots__ = ()
+
+    def submit(self):
+        super().submit()
+        self.agent.pool.del_chunk(self.when_done, self.hash)
 
 
 class PoolReadahead(Initializer):
     agent = None
     iterator = None
 
+    # The length this readahead was last registered with by the agent
+    registered_length = 0
+
     @initializer
     def agent_lock(self):
         return self.agent.lock
@@ -69,7 +154,7 @@ class PoolReadahead(Initializer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.lock = NLock
+        self.lock = self.agent_lock
         with self.agent_lock:
             self.iterator = iter(self.iterator)
             self.agent.register_readahead(self)
@@ -95,14 +180,22 @@ class PoolReadahead(Initializer):
             except IndexError:
                 raise StopIteration()
             finally:
-                with agent_cond:
-                    self.agent.register_readahead(self)
+                self.agent.register_readahead(self)
 
     def __del__(self):
+        # This may run during garbage collection in a thread that already
+        # holds the pool lock, so it must not take that lock. The agent's
+        # readaheads heapmap drops our entry by itself; leave it to the
+        # agent to subtract our length from its total later on.
         agent = self.agent
         if agent is not None:
-            with self.lock:
-                agent.unregister_readahead(self)
+            try:
+                expired_readaheads = agent.expired_readaheads
+            except AttributeError:
+                # the agent was already closed
+                pass
+            else:
+                expired_readaheads.append(self.registered_length)
 
     def __enter__(self):
         return self
@@ -114,7 +207,7 @@ class PoolReadahead(Initializer):
 
     def submit(self, func, callback, *args, **kwargs):
         assert self.lock
-        cond = self.cond
+        cond = self.agent_cond
         agent = self.agent
 
         def when_done(*args, **kwargs):
@@ -132,41 +225,67 @@ class PoolReadahead(Initializer):
     def dequeue(self):
         assert self.lock
         agent = self.agent
-        cond = self.cond
 
         iterator = self.iterator
         if iterator is None:
             agent.register_readahead(self)
             return
 
-        hash = next(iterator, None)
-        if hash is None:
-            self.iterator = None
-            agent.register_readahead(self)
-            return
-
-        action = PoolGetAction(hash=hash)
-        self.queue.append(action)
-
+        queue = self.queue
         pool = self.pool
-        value = pool.chunk_registry.get(hash)
-        if value is None:
+        chunk_registry = pool.chunk_registry
+        # The limit applies to all readaheads of the agent together.
+        total_readaheads = agent.total_readaheads
+        max_readaheads = agent.max_readaheads
+        added = 0
+        notify = False
+
+        # Chunks that are still in memory complete immediately, so keep
+        # going until we hit one that actually needs to be fetched or
+        # the agent reaches its readahead limit.
+        while True:
+            hash = next(iterator, None)
+            if hash is None:
+                self.iterator = None
+                notify = True
+                break
+
+            action = PoolGetAction(agent=self.agent, hash=hash)
+            queue.append(action)
+            added += 1
+
+            value = chunk_registry.get(hash)
+            if value is None:
+
+                def when_done(value, exception):
+                    action.value = value
+                    action.exception = exception
+                    action.done = True
 
-            def when_done(value, exception):
-                action.value = value
-                action.exception = exception
-                action.done = True
+                self.submit(pool.get_chunk, when_done, hash)
+                break
 
-            self.submit(pool.get_chunk, when_done, hash)
-        else:
             action.value = value
             action.done = True
-            cond.notify_all()
+            notify = True
+
+            if total_readaheads + added >= max_readaheads:
+                break
+
+        if notify:
+            self.agent_cond.notify_all()
 
         agent.register_readahead(self)
 
 
 class PoolAgent(Initializer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Lengths of readaheads that were garbage collected without being
+        # unregistered. Appended to without holding the pool lock, see
+        # PoolReadahead.__del__ and settle_readaheads().
+        self.expired_readaheads = []
+
     @initializer
     def lock(self):
         return self.pool.lock
@@ -185,11 +304,12 @@ class PoolAgent(Initializer):
 
     @initializer
     def pending_writes(self):
-        """Submitted write/delete actions that have not yet completed"""
+        """Submitted write/delete actions that have not yet completed, in
+        the order they were submitted"""
         assert self.lock
-        return MinHeapMap()
+        return OrderedDict()
 
-    # A function that will queue a direct action
+    # Direct actions that are waiting to be submitted to the pool
     @initializer
     def mailhook(self):
         assert self.lock
@@ -229,9 +349,21 @@ class PoolAgent(Initializer):
     def readahead(self, iterator):
         return PoolReadahead(agent=self, iterator=iterator)
 
+    def settle_readaheads(self):
+        """Subtract the lengths of readaheads that were garbage collected
+        without being unregistered from `total_readaheads`.
+
+        The pool lock must be held while calling this method."""
+
+        assert self.lock
+        expired_readaheads = self.expired_readaheads
+        while expired_readaheads:
+            self.total_readaheads -= expired_readaheads.pop()
+
     @property
     def avarice(self):
         assert self.lock
+        self.settle_readaheads()
         pending_writes = self.pending_writes
         pending_reads = self.pending_reads
         if self.mailhook or pending_writes or pending_reads:
@@ -250,6 +382,7 @@ class PoolAgent(Initializer):
     @property
     def eligible_readahead(self):
         assert self.lock
+        self.settle_readaheads()
         try:
             readahead, (spent, length) = self.readaheads.peekitem()
         except IndexError:
@@ -265,12 +398,12 @@ class PoolAgent(Initializer):
         pool = self.pool
 
         try:
-            op, dummy = self.mailhook.popitem()
+            action, dummy = self.mailhook.popitem()
         except KeyError:
             pass
         else:
             self.cond.notify_all()
-            op()
+            action.submit()
             return
 
         if self.pending_writes or self.pending_reads:
@@ -300,6 +433,7 @@ class PoolAgent(Initializer):
             self.total_readaheads -= old_length
 
         readaheads[readahead] = new
+        readahead.registered_length = new_length
         self.total_readaheads += new_length
         self.update_registration()
 
@@ -310,6 +444,7 @@ class PoolAgent(Initializer):
             spent, length = readaheads.pop(readahead)
         except KeyError:
             length = 0
+        readahead.registered_length = 0
         self.total_readaheads -= length
         self.update_registration()
 
@@ -326,74 +461,39 @@ class PoolAgent(Initializer):
             pool.register_agent(self)
         pool.replenish_queue()
 
-    def has_chunk(self, hash, wait=True):
-        lock = self.lock
-        with lock:
-            cond = self.cond
-            pool = self.pool
-
-            action = PoolHasAction(hash=hash, cond=cond)
-
-            def when_done(value, exception):
-                with lock:
-                    if exception:
-                        action.exception = exception
-                        self.exception = exception
-                    else:
-                        action.value = value
-                    self.pending_reads -= 1
-                    action.done = True
-                    cond.notify_all()
-
-            def mailbag():
-                self.pending_reads += 1
-                self.update_registration()
-                pool.has_chunk(when_done, hash)
+    def _mail(self, action):
+        """Queue an action for submission to the pool and wait until the pool
+        has accepted it.
 
-            mailhook = self.mailhook
-            mailhook[mailbag] = None
-            pool.register_agent(self)
-            pool.replenish_queue()
+        The pool lock must be held while calling this method.
 
-            while mailbag in mailhook:
-                cond.wait()
+        :param PoolAction action: The action to queue."""
 
-            if not wait:
-                return action
+        assert self.lock
+        pool = self.pool
+        cond = self.cond
+        mailhook = self.mailhook
+        mailhook[action] = None
+        pool.register_agent(self)
+        pool.replenish_queue()
 
-            return action.sync()
+        while action in mailhook:
+            cond.wait()
 
-    def get_chunk(self, hash, wait=True):
-        lock = self.lock
-        with lock:
-            cond = self.cond
-            pool = self.pool
-
-            action = PoolGetAction(hash=hash, cond=cond)
-
-            def when_done(value, exception):
-                with lock:
-                    if exception:
-                        action.exception = exception
-                        self.exception = exception
-                    else:
-                        action.value = value
-                    self.pending_reads -= 1
-                    action.done = True
-                    cond.notify_all()
+    def has_chunk(self, hash, wait=True):
+        with self.lock:
+            action = PoolHasAction(agent=self, hash=hash)
+            self._mail(action)
 
-            def mailbag():
-                self.pending_reads += 1
-                self.update_registration()
-                pool.get_chunk(when_done, hash)
+        if not wait:
+            return action
 
-            mailhook = self.mailhook
-            mailhook[mailbag] = None
-            pool.register_agent(self)
-            pool.replenish_queue()
+        return action.sync()
 
-            while mailbag in mailhook:
-                cond.wait()
+    def get_chunk(self, hash, wait=True):
+        with self.lock:
+            action = PoolGetAction(agent=self, hash=hash)
+            self._mail(action)
 
         if not wait:
             return action
@@ -401,42 +501,14 @@ class PoolAgent(Initializer):
         return action.sync()
 
     def put_chunk(self, hash, value, wait=True):
-        lock = self.lock
-        with lock:
-            cond = self.cond
-            pool = self.pool
-
+        with self.lock:
             if self.exception:
                 raise RuntimeError(
                     "an operation has failed. call agent.sync() first"
                 ) from self.exception[1]
 
-            action = PoolPutAction(hash=hash, value=value, cond=cond)
-
-            def when_done(exception):
-                with lock:
-                    del self.pending_writes[action]
-                    self.update_registration()
-                    if exception:
-                        action.exception = exception
-                        self.exception = exception
-                    action.done = True
-                    cond.notify_all()
-
-            def mailbag():
-                serial = self.next_action_serial
-                self.next_action_serial = serial + 1
-                self.pending_writes[action] = serial
-                self.update_registration()
-                pool.put_chunk(when_done, hash, value)
-
-            mailhook = self.mailhook
-            mailhook[mailbag] = None
-            pool.register_agent(self)
-            pool.replenish_queue()
-
-            while mailbag in mailhook:
-                cond.wait()
+            action = PoolPutAction(agent=self, hash=hash, value=value)
+            self._mail(action)
 
         if not wait:
             return action
@@ -444,42 +516,14 @@ class PoolAgent(Initializer):
         action.sync()
 
     def del_chunk(self, hash, wait=True):
-        lock = self.lock
-        with lock:
-            cond = self.cond
-            pool = self.pool
-
+        with self.lock:
             if self.exception:
                 raise RuntimeError(
                     "an operation has failed. call agent.sync() first"
                 ) from self.exception[1]
 
-            action = PoolDelAction(hash=hash, cond=cond)
-
-            def when_done(exception):
-                with lock:
-                    del self.pending_writes[action]
-                    self.update_registration()
-                    if exception:
-                        action.exception = exception
-                        self.exception = exception
-                    action.done = True
-                    cond.notify_all()
-
-            def mailbag():
-                serial = self.next_action_serial
-                self.next_action_serial = serial + 1
-                self.pending_writes[action] = serial
-                self.update_registration()
-                pool.del_chunk(when_done, hash)
-
-            mailhook = self.mailhook
-            mailhook[mailbag] = None
-            pool.register_agent(self)
-            pool.replenish_queue()
-
-            while mailbag in mailhook:
-                cond.wait()
+            action = PoolDelAction(agent=self, hash=hash)
+            self._mail(action)
 
         if not wait:
             return action
@@ -495,7 +539,9 @@ class PoolAgent(Initializer):
             cond = self.cond
             pending_writes = self.pending_writes
             serial = self.next_action_serial
-            while pending_writes and pending_writes.peek() < serial:
+            # Serials are assigned in increasing order, so the first entry
+            # is always the oldest write that is still pending.
+            while pending_writes and next(iter(pending_writes.values())) < serial:
                 cond.wait()
             exception = self.exception
             self.exception = None
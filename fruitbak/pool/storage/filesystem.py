@@ -1,8 +1,8 @@
 from base64 import b64decode, b64encode
-from itertools import chain
+from itertools import count
 from os import F_OK, O_CREAT, O_EXCL, O_NOFOLLOW, O_RDONLY, O_WRONLY, getpid, unlink
 from pathlib import Path
-from random import choice
+from random import getrandbits
 from re import compile as regcomp, escape
 from sys import exc_info
 from threading import get_ident as gettid
@@ -18,9 +18,6 @@ b64bytes = b'+_'
 b64chars = b64bytes.decode()
 b64escaped = escape(b64chars)
 
-b64seq = bytes(b64encode(bytes((i << 2,)), b64bytes)[0] for i in range(64)).decode()
-# b64set = set(b64seq)
-
 
 def my_b64encode(b):
     return b64encode(b, b64bytes).rstrip(b'=').decode()
@@ -30,6 +27,42 @@ def my_b64decode(s):
     return b64decode(s + '=' * (-len(s) & 3), b64bytes)
 
 
+def my_b64decode_joined(prefix, suffixes, size):
+    """Decode a list of base64 strings that share a common prefix and that
+    each encode exactly `size` bytes, using a single call to `b64decode`.
+
+    :param str prefix: The prefix common to all encoded strings.
+    :param list suffixes: The remainder of each encoded string.
+    :param int size: The number of bytes each string decodes to.
+    :return: The concatenation of all decoded values.
+    :rtype: bytes"""
+
+    if not suffixes:
+        return b''
+    length = len(prefix) + len(suffixes[0])
+    padding = 'A' * (-length & 3)
+    decoded = b64decode(
+        prefix + (padding + prefix).join(suffixes) + padding, b64bytes
+    )
+    stride = (length + len(padding)) // 4 * 3
+    if stride == size:
+        return decoded
+
+    # The padding left one or two filler bytes after each value.
+    buf = bytearray(decoded)
+    for column in reversed(range(size, stride)):
+        del buf[column::stride]
+        stride -= 1
+    return bytes(buf)
+
+
+# Temporary file names only need to be unique, so draw the random part
+# once and use a counter to tell the files apart. The random part guards
+# against leftovers from an earlier process that had the same pid.
+tmpfile_salt = my_b64encode(getrandbits(96).to_bytes(12, 'big'))
+tmpfile_serials = count()
+
+
 class FilesystemListAction(PoolAction):
     directory = None
     cursor = None
@@ -57,7 +90,7 @@ class FilesystemListahead(PoolReadahead):
             agent.register_readahead(self)
             return
 
-        action = FilesystemListAction(directory=directory)
+        action = FilesystemListAction(agent=agent, directory=directory)
         self.queue.append(action)
         pool = self.pool
 
@@ -82,7 +115,7 @@ class Filesystem(Storage):
 
     def hash2path(self, hash):
         b64 = my_b64encode(hash)
-        return Path(b64[:2]) / b64[2:]
+        return f'{b64[:2]}/{b64[2:]}'
 
     @initializer
     def is_valid_file_name(self):
@@ -112,12 +145,8 @@ class Filesystem(Storage):
 
     class NamedTemporaryFile:
         def __init__(self, path, mode=0o666, *, dir_fd=None):
-            name = ''.join(
-                chain(
-                    ('tmp-', str(getpid()), '-', str(gettid()), '-'),
-                    (choice(b64seq) for x in range(32)),
-                )
-            )
+            serial = next(tmpfile_serials)
+            name = f'tmp-{getpid()}-{gettid()}-{tmpfile_salt}-{serial}'
             path = Path(name) if path is None else Path(path) / name
             self.path = path
             self.dir_fd = dir_fd
@@ -208,7 +237,7 @@ class Filesystem(Storage):
 
     def put_chunk(self, callback, hash, value):
         path = self.hash2path(hash)
-        parent = path.parent
+        parent, _, _ = path.partition('/')
         tmpfile = self.tmpfile
         pooldir_fd = self.pooldir_fd
 
@@ -266,11 +295,8 @@ class Filesystem(Storage):
         def job():
             try:
                 with pooldir_fd.sysopendir(directory) as fd:
-                    hashbuf = b''.join(
-                        my_b64decode(directory + file)
-                        for file in fd.listdir()
-                        if is_valid_file_name(file)
-                    )
+                    files = list(filter(is_valid_file_name, fd.listdir()))
+                hashbuf = my_b64decode_joined(directory, files, hash_size)
                 cursor = Hashset(hashbuf, hash_size)
             except:
                 callback(None, exc_info())
@@ -296,7 +322,7 @@ else:
 
         def put_chunk(self, callback, hash, value):
             path = self.hash2path(hash)
-            parent = path.parent
+            parent, _, _ = path.partition('/')
             pooldir_fd = self.pooldir_fd
             proc_self_fd = self.proc_self_fd
 
@@ -68,7 +68,10 @@ class RsyncTransfer(Transfer):
 
     def transfer(self):
         newshare = self.newshare
+        put_chunk = newshare.put_chunk
+        add_dentry = newshare.add_dentry
         reference = self.reference
+        get_reference = reference.get
         one_filesystem = (b'--one-file-system',) if self.one_filesystem else ()
 
         def normalize(path):
@@ -103,7 +106,7 @@ class RsyncTransfer(Transfer):
             )
             if hardlink is None:
                 if dentry.is_file:
-                    ref_dentry = reference.get(name)
+                    ref_dentry = get_reference(name)
                     if _samedentry(dentry, ref_dentry):
                         dentry.size = ref_dentry.size
                         dentry.hashes = ref_dentry.hashes
@@ -117,10 +120,10 @@ class RsyncTransfer(Transfer):
                             if chunk is None:
                                 dentry.size = size
                                 dentry.hashes = hashes
-                                newshare.add_dentry(dentry)
+                                add_dentry(dentry)
                             else:
                                 size += len(chunk)
-                                hashes.append(newshare.put_chunk(None, chunk))
+                                hashes.append(put_chunk(None, chunk))
 
                         return data_callback
                 elif dentry.is_symlink:
@@ -130,7 +133,7 @@ class RsyncTransfer(Transfer):
             else:
                 dentry.is_hardlink = True
                 dentry.hardlink = hardlink
-            newshare.add_dentry(dentry)
+            add_dentry(dentry)
 
         host_name = self.host.name
 
@@ -8,4 +8,5 @@ from fruitbak.util.tabulate import *
 from fruitbak.util.threadpool import *
 from fruitbak.util.time import *
 from fruitbak.util.weak import *
+from fruitbak.util.weakcache import *
 from fruitbak.util.weakheapmap import *
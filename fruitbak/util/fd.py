@@ -69,6 +69,12 @@ except ImportError:
     # that's ok, O_LARGEFILE is just advisory
     O_LARGEFILE = 0
 
+try:
+    from os import posix_fadvise as os_posix_fadvise
+except ImportError:
+    # that's ok, posix_fadvise is just advisory
+    os_posix_fadvise = None
+
 
 def unpath(obj):
     """Convert Path-like objects to str; pass through other objects
@@ -683,6 +689,22 @@ class fd(int):
 
         return os_fdatasync(self)
 
+    def fadvise(self, offset, length, advice):
+        """Announce an intention to access file data in a specific pattern,
+        so the operating system can optimize caching and readahead. See
+        `os.posix_fadvise` for details. Does nothing on platforms that do
+        not support it.
+
+        :param int offset: The start of the region the advice applies to.
+        :param int length: The length of the region (0 means until the end).
+        :param int advice: One of the `os.POSIX_FADV_*` constants."""
+
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        if os_posix_fadvise is not None:
+            os_posix_fadvise(self, offset, length, advice)
+
     def pathconf(self, name):
         """Return system configuration information relevant to the file referred to
         by this file descriptor. See `os.pathconf` for details.
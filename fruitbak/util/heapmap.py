@@ -219,7 +219,7 @@ class HeapMap(MutableMapping):
     def __getitem__(self, key):
         return self.mapping[key].value
 
-    def get(key, default=None):
+    def get(self, key, default=None):
         """Return the value for `key` if `key` is in the mapping, else `default`.
         If `default` is not given, it defaults to `None`, so that this method never
         raises a `KeyError`.
@@ -228,15 +228,10 @@ class HeapMap(MutableMapping):
         :param default: The value to return if `key` was not found.
         :return: The value belonging to `key` or `default` if it was not found."""
 
-        mapping = self.mapping
-        try:
-            node = mapping[key]
-        except KeyError:
-            pass
-        else:
-            return node.value
-
-        return default
+        node = self.mapping.get(key)
+        if node is None:
+            return default
+        return node.value
 
     def __setitem__(self, key, value):
         self._setitem(key, value)
@@ -383,12 +378,8 @@ class HeapMap(MutableMapping):
 
         :param key: The key to remove."""
 
-        mapping = self.mapping
-        try:
-            node = mapping[key]
-        except KeyError:
-            pass
-        else:
+        node = self.mapping.get(key)
+        if node is not None:
             self._delnode(node)
 
     def _delnode(self, victim):
@@ -550,6 +541,18 @@ class HeapMap(MutableMapping):
             item = self.mapping[key]
         return item.key, item.value
 
+    def peekitem_or_none(self):
+        """Return a tuple of the key and the value in the heap with the
+        smallest/largest value, or `None` if the heap is empty.
+
+        :return: A tuple of (key, value) or `None`."""
+
+        heap = self.heap
+        if not heap:
+            return None
+        item = heap[0]
+        return item.key, item.value
+
     @unlocked
     def keys(self):
         """Return a view of the keys.
@@ -429,6 +429,8 @@ class Initializer:
     :param dict kwargs: Attributes (and their values) to set.
     """
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         for pair in kwargs.items():
             setattr(self, *pair)
@@ -0,0 +1,132 @@
+"""Weak value dictionary that keeps recently used values alive.
+
+A `weakref.WeakValueDictionary` forgets an entry as soon as the last strong
+reference to its value disappears. That is exactly right for sharing
+objects that are in use, but it means that a value that was used a moment
+ago and is requested again has to be recreated from scratch.
+
+`WeakValueCache` behaves like a `weakref.WeakValueDictionary` but also
+keeps strong references to the `maxsize` values that were most recently
+stored or retrieved. Values that are still referenced elsewhere remain
+available regardless of this limit.
+
+Like `weakref.WeakValueDictionary`, it is not threadsafe."""
+
+from collections import OrderedDict
+from weakref import WeakValueDictionary
+
+
+class WeakValueCache(WeakValueDictionary):
+    """WeakValueCache(maxsize = 128, other = None, **kwargs)
+
+    A `weakref.WeakValueDictionary` that retains strong references to the
+    `maxsize` most recently used values.
+
+    :param int maxsize: The number of values to keep alive. If 0, this
+            class behaves like a plain `weakref.WeakValueDictionary`.
+    :param other: Initial contents, as for `dict()`.
+    :type other: dict or iter(iter)
+    :param dict kwargs: Initial contents, as for `dict()`."""
+
+    def __init__(self, maxsize=128, other=(), **kwargs):
+        self.maxsize = maxsize
+        self.recent = OrderedDict()
+        super().__init__(other, **kwargs)
+
+    def _retain(self, key, value):
+        maxsize = self.maxsize
+        if maxsize:
+            recent = self.recent
+            recent[key] = value
+            recent.move_to_end(key)
+            if len(recent) > maxsize:
+                recent.popitem(last=False)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self._retain(key, value)
+        return value
+
+    def get(self, key, default=None):
+        """Return the value for `key` if `key` is in the cache, else `default`.
+        A value that is found is marked as most recently used.
+
+        :param key: The key to look up.
+        :param default: The value to return if `key` was not found.
+        :return: The value belonging to `key` or `default` if it was not found."""
+
+        value = super().get(key)
+        if value is None:
+            return default
+        self._retain(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._retain(key, value)
+
+    def setdefault(self, key, default=None):
+        """If `key` is in the cache, return its value. If not, insert `key` with
+        a value of `default` and return `default`.
+
+        :param key: The key to look up and/or insert.
+        :param default: The value to use if `key` is not in the cache.
+        :return: Either the existing value or the default."""
+
+        value = self.get(key)
+        if value is None:
+            self[key] = default
+            return default
+        return value
+
+    def update(self, other=(), **kwargs):
+        """Update the cache with the key/value pairs from `other` and `kwargs`,
+        overwriting existing keys. The new values are marked as most recently
+        used.
+
+        :param other: Add these items to the cache.
+        :type other: dict or iter(iter)
+        :param dict kwargs: Add all keyword items to the cache."""
+
+        for key, value in dict(other, **kwargs).items():
+            self[key] = value
+
+    def copy(self):
+        """Create a shallow copy of this cache with the same `maxsize`.
+
+        :return: The new cache."""
+
+        return type(self)(self.maxsize, self.items())
+
+    __copy__ = copy
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.recent.pop(key, None)
+
+    def pop(self, key, *args):
+        """Remove `key` and return its value. If `key` is not found, return the
+        default if given, otherwise raise `KeyError`.
+
+        :param key: The key to remove.
+        :param default: The value to return if `key` was not found.
+        :return: The value belonging to `key`."""
+
+        self.recent.pop(key, None)
+        return super().pop(key, *args)
+
+    def popitem(self):
+        """Remove and return an arbitrary (key, value) pair.
+
+        :return: A tuple of (key, value)."""
+
+        key, value = super().popitem()
+        self.recent.pop(key, None)
+        return key, value
+
+    def clear(self):
+        """Remove all entries, including the strong references to recently
+        used values."""
+
+        self.recent.clear()
+        super().clear()
@@ -40,22 +40,6 @@ class _NoValue:
 _no_value = _NoValue()
 
 
-# Internal class to fake a node for key lookup purposes.
-# Real WeakHeapMapNodes are expensive because they inherit from weakref.
-class FakeKeyWeakHeapMapNode:
-    __slots__ = 'id', 'hash'
-
-    def __init__(self, id):
-        self.id = id
-        self.hash = hash(id)
-
-    def __hash__(self):
-        return self.hash
-
-    def __eq__(self, other):
-        return self.id == other.id
-
-
 # Internal class to fake a node for value comparison purposes.
 # Real WeakHeapMapNodes are expensive because they inherit from weakref.
 class FakeValueWeakHeapMapNode:
@@ -67,8 +51,10 @@ class FakeValueWeakHeapMapNode:
 
 
 # Internal class that represents a node in the weakheapmap.
+# The mapping is keyed by the node's id attribute, which is the id() of
+# the key, so lookups do not need to allocate anything.
 class WeakHeapMapNode(weakref):
-    __slots__ = 'value', 'index', 'serial', 'id', 'hash'
+    __slots__ = 'value', 'index', 'serial', 'id'
 
     def __new__(type, key, finalizer, value, index, serial):
         return super(type, WeakHeapMapNode).__new__(type, key, finalizer)
@@ -76,19 +62,10 @@ class WeakHeapMapNode(weakref):
     def __init__(self, key, finalizer, value, index, serial):
         super().__init__(key, finalizer)
 
-        key_id = id(key)
-
         self.value = value
         self.index = index
         self.serial = serial
-        self.id = key_id
-        self.hash = hash(key_id)
-
-    def __hash__(self):
-        return self.hash
-
-    def __eq__(self, other):
-        return self.id == other.id
+        self.id = id(key)
 
 
 # Internal class that is returned for HeapMap.keys()
@@ -97,10 +74,10 @@ class WeakHeapMapKeysView(KeysView):
         super().__init__(heapmap.mapping)
 
     def __contains__(self, key):
-        return FakeKeyWeakHeapMapNode(id(key)) in self._mapping
+        return id(key) in self._mapping
 
     def __iter__(self):
-        for node in self._mapping:
+        for node in self._mapping.values():
             key = node()
             if key is not None:
                 yield key
@@ -112,13 +89,13 @@ class WeakHeapMapValuesView(ValuesView):
         super().__init__(heapmap.mapping)
 
     def __contains__(self, value):
-        for node in self.mapping:
+        for node in self._mapping.values():
             if node.value == value:
                 return True
         return False
 
     def __iter__(self):
-        for node in self.mapping:
+        for node in self._mapping.values():
             yield node.value
 
 
@@ -130,14 +107,14 @@ class WeakHeapMapItemsView(ItemsView):
     def __contains__(self, item):
         key, value = item
         try:
-            node = self.mapping[FakeKeyWeakHeapMapNode(id(key))]
+            node = self._mapping[id(key)]
         except KeyError:
             return False
         v = node.value
         return v is value or v == value
 
     def __iter__(self):
-        for node in heapmap.mapping:
+        for node in self._mapping.values():
             key = node()
             if key is not None:
                 yield key, node.value
@@ -203,7 +180,7 @@ class WeakHeapMap(MutableMapping):
                     container = WeakHeapMapNode(
                         key, finalizer, value, len(heap), heap_len
                     )
-                    mapping[container] = container
+                    mapping[container.id] = container
                     heap.append(container)
                     heap_len += 1
             elif hasattr(items, 'keys'):
@@ -211,7 +188,7 @@ class WeakHeapMap(MutableMapping):
                     container = WeakHeapMapNode(
                         key, finalizer, items[key], len(heap), heap_len
                     )
-                    mapping[container] = container
+                    mapping[container.id] = container
                     heap.append(container)
                     heap_len += 1
             else:
@@ -219,12 +196,12 @@ class WeakHeapMap(MutableMapping):
                     container = WeakHeapMapNode(
                         key, finalizer, value, len(heap), heap_len
                     )
-                    mapping[container] = container
+                    mapping[container.id] = container
                     heap.append(container)
                     heap_len += 1
             for key, value in kwargs.items():
                 container = WeakHeapMapNode(key, finalizer, value, len(heap), heap_len)
-                mapping[container] = container
+                mapping[container.id] = container
                 heap.append(container)
                 heap_len += 1
 
@@ -273,14 +250,14 @@ class WeakHeapMap(MutableMapping):
     @unlocked
     def __iter__(self):
         mapping = self.mapping
-        for node in mapping:
+        for node in mapping.values():
             key = node()
             if key is not None:
                 yield key
 
     @unlocked
     def __contains__(self, key):
-        return FakeKeyWeakHeapMapNode(id(key)) in self.mapping
+        return id(key) in self.mapping
 
     @unlocked
     def __len__(self):
@@ -288,9 +265,9 @@ class WeakHeapMap(MutableMapping):
 
     @unlocked
     def __getitem__(self, key):
-        return self.mapping[FakeKeyWeakHeapMapNode(id(key))].value
+        return self.mapping[id(key)].value
 
-    def get(key, default=None):
+    def get(self, key, default=None):
         """Return the value for `key` if `key` is in the mapping, else `default`.
         If `default` is not given, it defaults to `None`, so that this method never
         raises a `KeyError`.
@@ -299,18 +276,10 @@ class WeakHeapMap(MutableMapping):
         :param default: The value to return if `key` was not found.
         :return: The value belonging to `key` or `default` if it was not found."""
 
-        mapping = self.mapping
-        fakekey = FakeKeyWeakHeapMapNode(id(key))
-        try:
-            node = mapping[fakekey]
-        except KeyError:
-            pass
-        else:
-            node_key = node()
-            if node_key is not None:
-                return node.value
-
-        return default
+        node = self.mapping.get(id(key))
+        if node is None or node() is None:
+            return default
+        return node.value
 
     def __setitem__(self, key, value):
         self._setitem(key, value)
@@ -326,7 +295,7 @@ class WeakHeapMap(MutableMapping):
 
     @unlocked
     def _setitem(self, key, value):
-        self._setnode(self.mapping.get(FakeKeyWeakHeapMapNode(id(key))), key, value)
+        self._setnode(self.mapping.get(id(key)), key, value)
 
     @unlocked
     def _setnode(self, container, key, value):
@@ -341,11 +310,10 @@ class WeakHeapMap(MutableMapping):
                 # we give it a unique, different id so it doesn't conflict
                 # with the new key being added. For this we use the id()
                 # of the container itself since it's unique and occupied.
-                del mapping[container]
+                del mapping[container.id]
                 container_id = id(container)
                 container.id = container_id
-                container.hash = hash(container_id)
-                mapping[container] = container
+                mapping[container_id] = container
 
             index = heap_len
             serial = self._serial
@@ -362,7 +330,7 @@ class WeakHeapMap(MutableMapping):
                     break
 
             index = heap_len
-            mapping[container] = container
+            mapping[container.id] = container
             heap.append(container)
             answers.reverse()
 
@@ -452,7 +420,7 @@ class WeakHeapMap(MutableMapping):
                 heap[index] = container
 
     def __delitem__(self, key):
-        node = self.mapping[FakeKeyWeakHeapMapNode(id(key))]
+        node = self.mapping[id(key)]
         node_key = node()
         if node_key is None:
             raise KeyError(key)
@@ -464,7 +432,7 @@ class WeakHeapMap(MutableMapping):
 
         :param key: The key to remove."""
 
-        node = self.mapping[FakeKeyWeakHeapMapNode(id(key))]
+        node = self.mapping[id(key)]
         node_key = node()
         if node_key is None:
             raise KeyError(key)
@@ -475,16 +443,9 @@ class WeakHeapMap(MutableMapping):
 
         :param key: The key to remove."""
 
-        mapping = self.mapping
-        fakekey = FakeKeyWeakHeapMapNode(id(key))
-        try:
-            node = mapping[fakekey]
-        except KeyError:
-            pass
-        else:
-            node_key = node()
-            if node_key is not None:
-                self._delnode(node)
+        node = self.mapping.get(id(key))
+        if node is not None and node() is not None:
+            self._delnode(node)
 
     @unlocked
     def _delnode(self, victim):
@@ -496,7 +457,7 @@ class WeakHeapMap(MutableMapping):
 
         if index == heap_len:
             heap.pop()
-            del mapping[victim]
+            del mapping[victim.id]
             return
 
         replacement = heap[heap_len]
@@ -536,7 +497,7 @@ class WeakHeapMap(MutableMapping):
                 else:
                     break
 
-        del mapping[victim]
+        del mapping[victim.id]
         heap.pop()
         index = victim.index
         answers.reverse()
@@ -613,7 +574,7 @@ class WeakHeapMap(MutableMapping):
                 if ret_key is not None:
                     return ret_key, ret.value
         else:
-            ret = self.mapping[FakeKeyWeakHeapMapNode(id(key))]
+            ret = self.mapping[id(key)]
             ret_key = ret()
             if ret_key is None:
                 raise KeyError(key)
@@ -657,12 +618,28 @@ class WeakHeapMap(MutableMapping):
                     return ret_key, ret.value
                 self._delnode(ret)
         else:
-            ret = self.mapping[FakeKeyWeakHeapMapNode(id(key))]
+            ret = self.mapping[id(key)]
             ret_key = ret()
             if ret_key is None:
                 raise KeyError(key)
             return ret_key, ret.value
 
+    def peekitem_or_none(self):
+        """Return a tuple of the key and the value in the heap with the
+        smallest/largest value, or `None` if the heap is empty (or only
+        contains entries whose keys have expired).
+
+        :return: A tuple of (key, value) or `None`."""
+
+        heap = self.heap
+        while heap:
+            ret = heap[0]
+            ret_key = ret()
+            if ret_key is not None:
+                return ret_key, ret.value
+            self._delnode(ret)
+        return None
+
     @unlocked
     def keys(self):
         """Return a view of the keys.
@@ -723,9 +700,8 @@ class WeakHeapMap(MutableMapping):
         :return: Either the existing value or the default."""
 
         mapping = self.mapping
-        fakenode = FakeKeyWeakHeapMapNode(id(key))
         try:
-            ret = mapping[fakenode]
+            ret = mapping[id(key)]
         except KeyError:
             ret_key = None
         else:
@@ -780,7 +756,7 @@ class WeakHeapMap(MutableMapping):
         :param key: The key for entry to add or update.
         :param value: The new value for the entry (optional)."""
 
-        ret = self.mapping.get(FakeKeyWeakHeapMapNode(id(key)))
+        ret = self.mapping.get(id(key))
         if ret is None:
             if value is _no_value:
                 raise KeyError(key)
@@ -0,0 +1,136 @@
+from unittest import TestCase, main
+
+from fruitbak.pool import Pool
+
+
+class DeferredStorage:
+    """Stand-in for a storage backend that only completes requests when
+    `run()` is called, so that tests control when callbacks happen.
+
+    If `error` is set, the next request raises it instead of being queued."""
+
+    def __init__(self):
+        self.requests = []
+        self.error = None
+
+    def get_chunk(self, callback, hash):
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+        self.requests.append((callback, hash))
+
+    def run(self):
+        requests = self.requests
+        while requests:
+            callback, hash = requests.pop(0)
+            callback(b'chunk ' + hash, None)
+
+
+class TestPoolReadahead(TestCase):
+    def setUp(self):
+        self.storage = DeferredStorage()
+        self.pool = Pool(root=self.storage, config=dict(pool_max_readaheads=4))
+
+    def test_collected_while_locked(self):
+        agent = self.pool.agent()
+        readahead = agent.readahead(iter([b'a', b'b', b'c']))
+        self.storage.run()
+        with agent.lock:
+            self.assertEqual(agent.total_readaheads, 3)
+            # The finalizer runs right here, with the pool lock held.
+            del readahead
+            self.assertIsNone(agent.eligible_readahead)
+            self.assertEqual(agent.total_readaheads, 0)
+            self.assertEqual(len(agent.readaheads), 0)
+
+    def test_burst_is_capped(self):
+        pool = self.pool
+        hashes = [b'%d' % i for i in range(10)]
+        # Hold on to the chunks so that they stay in the registry.
+        with pool.lock:
+            chunks = [pool.exchange_chunk(hash, b'chunk ' + hash) for hash in hashes]
+
+        agent = pool.agent()
+        first = agent.readahead(iter(hashes))
+        # All chunks were in memory, so they complete without any I/O,
+        # up to the agent's limit.
+        self.assertEqual(self.storage.requests, [])
+        self.assertEqual(len(first), 4)
+
+        # An agent at its limit still lets a new readahead make progress,
+        # but only by a single entry.
+        second = agent.readahead(iter(hashes))
+        self.assertEqual(len(second), 1)
+        with agent.lock:
+            self.assertEqual(agent.total_readaheads, 5)
+
+        self.assertEqual(bytes(next(first).value), b'chunk 0')
+        self.assertEqual(bytes(next(second).value), b'chunk 0')
+        self.assertEqual(self.storage.requests, [])
+
+
+class TestPoolGetChunk(TestCase):
+    def setUp(self):
+        self.storage = DeferredStorage()
+        self.pool = Pool(root=self.storage, config=dict())
+
+    def test_coalesced(self):
+        pool = self.pool
+        first = pool.agent().get_chunk(b'a', wait=False)
+        second = pool.agent().get_chunk(b'a', wait=False)
+        self.assertEqual(len(self.storage.requests), 1)
+
+        self.storage.run()
+        self.assertEqual(bytes(first.sync()), b'chunk a')
+        self.assertEqual(bytes(second.sync()), b'chunk a')
+
+    def test_registry_hit(self):
+        pool = self.pool
+        # Hold on to the chunk so that it stays in the registry.
+        with pool.lock:
+            chunk = pool.exchange_chunk(b'a', b'chunk a')
+
+        value = pool.agent().get_chunk(b'a')
+        self.assertEqual(self.storage.requests, [])
+        self.assertIs(value, chunk)
+
+    def test_failing_callback(self):
+        pool = self.pool
+        results = []
+
+        def failing(value, exception):
+            raise RuntimeError('callback failed')
+
+        def succeeding(value, exception):
+            results.append(bytes(value))
+
+        with pool.lock:
+            pool.get_chunk(failing, b'a')
+            pool.get_chunk(succeeding, b'a')
+
+        with self.assertRaises(RuntimeError):
+            self.storage.run()
+        self.assertEqual(results, [b'chunk a'])
+        self.assertEqual(pool.inflight_reads, {})
+
+    def test_failing_submit(self):
+        pool = self.pool
+        storage = self.storage
+        storage.error = OSError('submit failed')
+
+        with pool.lock:
+            with self.assertRaises(OSError):
+                pool.get_chunk(lambda value, exception: None, b'a')
+            self.assertEqual(pool.inflight_reads, {})
+
+        # A later read of the same chunk is not stuck waiting for the
+        # request that never happened.
+        action = pool.agent().get_chunk(b'a', wait=False)
+        self.assertEqual(len(storage.requests), 1)
+        storage.run()
+        self.assertEqual(bytes(action.sync()), b'chunk a')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from os import urandom
+from unittest import TestCase, main
+
+from fruitbak.pool.storage.filesystem import my_b64decode, my_b64decode_joined, my_b64encode
+
+
+class TestB64DecodeJoined(TestCase):
+    def check(self, size, count):
+        # The first two characters encode the top 12 bits, so fix those.
+        values = [b'\x12' + bytes([0x30 | x & 0xf]) + urandom(size - 2) for x in range(count)]
+        encoded = [my_b64encode(value) for value in values]
+        prefix = encoded[0][:2]
+        self.assertTrue(all(s.startswith(prefix) for s in encoded))
+        suffixes = [s[2:] for s in encoded]
+        expected = b''.join(my_b64decode(prefix + s) for s in suffixes)
+        self.assertEqual(expected, b''.join(values))
+        self.assertEqual(my_b64decode_joined(prefix, suffixes, size), expected)
+
+    def test_padding(self):
+        # 30, 31 and 32 byte values need 0, 2 and 1 padding characters.
+        for size in (30, 31, 32):
+            with self.subTest(size=size):
+                self.check(size, 5)
+                self.check(size, 1)
+
+    def test_empty(self):
+        self.assertEqual(my_b64decode_joined('AA', [], 32), b'')
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,12 @@ class TestHeapMap(TestCase):
             self.assertEqual(h.popkey(), chr(ord('a') + y))
         self.assertEqual(h.popkey(), 'n')
 
+    def test_get(self):
+        h = MinHeapMap(a=1, b=2)
+        self.assertEqual(h.get('a'), 1)
+        self.assertIsNone(h.get('c'))
+        self.assertEqual(h.get('c', 3), 3)
+
 
 if __name__ == '__main__':
     raise Exception("wtf")
@@ -0,0 +1,49 @@
+from gc import collect as gc
+from unittest import TestCase, main
+
+from fruitbak.util import *
+
+
+class dummy:
+    pass
+
+
+class TestWeakValueCache(TestCase):
+    def test_retention(self):
+        c = WeakValueCache(2)
+        c['a'] = dummy()
+        c['b'] = dummy()
+        gc()
+        self.assertIn('a', c)
+        self.assertIn('b', c)
+
+        # touching 'a' makes 'b' the least recently used entry
+        self.assertIsNotNone(c.get('a'))
+        c['c'] = dummy()
+        gc()
+        self.assertIn('a', c)
+        self.assertNotIn('b', c)
+        self.assertIn('c', c)
+
+        # values that are referenced elsewhere are not evicted
+        d = dummy()
+        c['d'] = d
+        c['e'] = dummy()
+        c['f'] = dummy()
+        gc()
+        self.assertIs(c['d'], d)
+        self.assertNotIn('a', c)
+
+        del c['d']
+        self.assertNotIn('d', c.recent)
+        self.assertEqual(c.get('d', 42), 42)
+
+    def test_disabled(self):
+        c = WeakValueCache(0)
+        c['a'] = dummy()
+        gc()
+        self.assertNotIn('a', c)
+
+
+if __name__ == '__main__':
+    main()
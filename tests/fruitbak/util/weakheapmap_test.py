@@ -49,6 +49,28 @@ class TestWeakHeapMap(TestCase):
         for x, d in enumerate(data):
             self.assertEqual(h.popitem(), d)
 
+    def test_peekitem_or_none(self):
+        h = MinWeakHeapMap()
+        self.assertIsNone(h.peekitem_or_none())
+        a = dummy('a')
+        b = dummy('b')
+        h[a] = 2
+        h[b] = 1
+        self.assertEqual(h.peekitem_or_none(), (b, 1))
+        del b
+        gc()
+        self.assertEqual(h.peekitem_or_none(), (a, 2))
+        del a
+        gc()
+        self.assertIsNone(h.peekitem_or_none())
+
+    def test_get(self):
+        a = dummy('a')
+        h = MinWeakHeapMap([(a, 1)])
+        self.assertEqual(h.get(a), 1)
+        self.assertIsNone(h.get(dummy('a')))
+        self.assertEqual(h.get(dummy('b'), 2), 2)
+
 
 if __name__ == '__main__':
     main()